@@ -4,30 +4,105 @@ CSV Formatter
 A utility for transforming and formatting CSV files with UTF-8 encoding support.
 """
 
+import codecs
 import csv
+import mmap
 import os
 import chardet
 import argparse
 
 
-def detect_encoding(file_path):
+# Buffer size for streaming CSV/TXT reads and writes
+_IO_BUFFER_SIZE = 1024 * 1024
+
+
+def _fast_encoding(file_path, sample_size=4096):
+    """
+    Cheaply recognise BOM-marked and UTF-8 files without running chardet.
+    
+    A file is only taken to be UTF-8 when the sample contains non-ASCII
+    bytes that decode as valid UTF-8.
+    
+    Args:
+        file_path (str): Path to the file
+        sample_size (int): Number of bytes to inspect
+        
+    Returns:
+        str: Encoding if it could be determined, otherwise None
+    """
+    with open(file_path, 'rb') as f:
+        data = f.read(sample_size)
+    
+    if data.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    # The UTF-32-LE BOM begins with the UTF-16-LE one, so it is checked first
+    if data.startswith((codecs.BOM_UTF32_LE, codecs.BOM_UTF32_BE)):
+        return 'utf-32'
+    if data.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return 'utf-16'
+    
+    if not data:
+        return 'utf-8'  # Empty file
+    
+    # An ASCII-only sample fits every common encoding, so it says nothing
+    # about the bytes that follow it
+    if data.isascii():
+        return None
+    
+    # Decode incrementally so a multi-byte character cut off at the end
+    # of the sample is not mistaken for invalid UTF-8
+    try:
+        codecs.getincrementaldecoder('utf-8')().decode(data, final=False)
+    except UnicodeDecodeError:
+        return None
+    return 'utf-8'
+
+
+def detect_encoding(file_path, max_bytes=1_000_000):
     """
     Detect the encoding of a file.
     
+    BOM-marked files, and UTF-8 files with non-ASCII text near the start,
+    are recognised from a short sample. Other files are fed to chardet in
+    blocks and detection stops as soon as chardet is confident, so only the
+    start of large files is read.
+    
     Args:
         file_path (str): Path to the file
+        max_bytes (int): Maximum number of bytes to feed to the detector
         
     Returns:
         str: Detected encoding
     """
-    with open(file_path, 'rb') as f:
-        raw_data = f.read()
-        result = chardet.detect(raw_data)
-    return result['encoding']
+    encoding = _fast_encoding(file_path)
+    if encoding:
+        return encoding
+    
+    # Map the file rather than reading it so only the pages handed to chardet
+    # are loaded. Empty files never get here: _fast_encoding handles them
+    detector = chardet.UniversalDetector()
+    with open(file_path, 'rb') as f, \
+         mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        limit = min(len(mm), max_bytes)
+        end = 0
+        for offset in range(0, limit, 65536):
+            end = min(offset + 65536, limit)
+            detector.feed(mm[offset:end])
+            if detector.done:
+                break
+        read_whole_file = end == len(mm)
+    detector.close()
+    
+    encoding = detector.result['encoding'] or 'utf-8'
+    # An ASCII verdict only covers the bytes chardet saw. If the scan stopped
+    # early, use UTF-8, its superset, so later non-ASCII text still decodes
+    if encoding.lower() == 'ascii' and not read_whole_file:
+        return 'utf-8'
+    return encoding
 
 
 def format_csv(input_file, output_file, encoding='utf-8', delimiter=',', 
-              transformations=None):
+              transformations=None, fast_join=False):
     """
     Format a CSV file with UTF-8 encoding and apply transformations.
     
@@ -37,26 +112,38 @@ def format_csv(input_file, output_file, encoding='utf-8', delimiter=',',
         encoding (str): Target encoding (default: utf-8)
         delimiter (str): CSV delimiter character
         transformations (callable, optional): Function to transform each row
+        fast_join (bool): Write rows with a plain join instead of csv.writer.
+            This skips quoting, so only use it for data whose fields contain
+            no delimiters, quotes or line breaks. Ignored when transformations
+            are given, as they may return values that are not strings
     """
     # Detect source encoding if not specified
     source_encoding = detect_encoding(input_file)
     print(f"Detected encoding: {source_encoding}")
     
-    # Read the CSV with detected encoding
-    with open(input_file, 'r', encoding=source_encoding) as infile:
+    # Stream rows from the source encoding straight to the target encoding,
+    # applying transformations on the way so only one row is held at a time.
+    # Formatting a file in place needs it read completely before it is rewritten
+    in_place = os.path.exists(output_file) and os.path.samefile(input_file, output_file)
+    
+    with open(input_file, 'r', encoding=source_encoding, newline='', buffering=_IO_BUFFER_SIZE) as infile:
         reader = csv.reader(infile, delimiter=delimiter)
         headers = next(reader)
-        rows = list(reader)
-    
-    # Apply transformations if provided
-    if transformations:
-        rows = [transformations(row) for row in rows]
-    
-    # Write to output file with UTF-8 encoding
-    with open(output_file, 'w', encoding=encoding, newline='') as outfile:
-        writer = csv.writer(outfile, delimiter=delimiter)
-        writer.writerow(headers)
-        writer.writerows(rows)
+        rows = list(reader) if in_place else reader
+        
+        with open(output_file, 'w', encoding=encoding, newline='', buffering=_IO_BUFFER_SIZE) as outfile:
+            if fast_join and not transformations:
+                # Same line terminator as csv.writer, but no per-field quoting
+                outfile.write(delimiter.join(headers) + '\r\n')
+                outfile.writelines(delimiter.join(row) + '\r\n' for row in rows)
+            else:
+                writer = csv.writer(outfile, delimiter=delimiter)
+                writer.writerow(headers)
+                
+                if transformations:
+                    writer.writerows(map(transformations, rows))
+                else:
+                    writer.writerows(rows)
     
     print(f"Formatted CSV saved to {output_file} with {encoding} encoding")
 
@@ -68,10 +155,12 @@ def main():
     parser.add_argument('output', help='Output CSV file')
     parser.add_argument('--encoding', default='utf-8', help='Target encoding')
     parser.add_argument('--delimiter', default=',', help='CSV delimiter')
+    parser.add_argument('--fast-join', action='store_true',
+                        help='Write rows without quoting (only for fields free of delimiters, quotes and line breaks)')
     
     args = parser.parse_args()
     
-    format_csv(args.input, args.output, args.encoding, args.delimiter)
+    format_csv(args.input, args.output, args.encoding, args.delimiter, fast_join=args.fast_join)
 
 
 if __name__ == "__main__":
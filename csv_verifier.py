@@ -4,36 +4,149 @@ CSV Verifier
 A utility for verifying CSV file structure and encoding.
 """
 
+import codecs
 import csv
+import functools
+import mmap
 import os
 import chardet
 import argparse
-from collections import Counter
+import sys
+from collections import Counter, deque
 
 
-def detect_encoding(file_path):
+# Buffer size for streaming CSV/TXT reads and writes
+_IO_BUFFER_SIZE = 1024 * 1024
+
+# Delimiters considered when auto-detecting the structure of a file
+_POTENTIAL_DELIMITERS = (',', ';', '\t', '|')
+
+
+def _fast_encoding(file_path, sample_size=4096):
+    """
+    Cheaply recognise BOM-marked and UTF-8 files without running chardet.
+    
+    A file is only taken to be UTF-8 when the sample contains non-ASCII
+    bytes that decode as valid UTF-8.
+    
+    Args:
+        file_path (str): Path to the file
+        sample_size (int): Number of bytes to inspect
+        
+    Returns:
+        str: Encoding if it could be determined, otherwise None
+    """
+    with open(file_path, 'rb') as f:
+        data = f.read(sample_size)
+    
+    if data.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    # The UTF-32-LE BOM begins with the UTF-16-LE one, so it is checked first
+    if data.startswith((codecs.BOM_UTF32_LE, codecs.BOM_UTF32_BE)):
+        return 'utf-32'
+    if data.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return 'utf-16'
+    
+    if not data:
+        return 'utf-8'  # Empty file
+    
+    # An ASCII-only sample fits every common encoding, so it says nothing
+    # about the bytes that follow it
+    if data.isascii():
+        return None
+    
+    # Decode incrementally so a multi-byte character cut off at the end
+    # of the sample is not mistaken for invalid UTF-8
+    try:
+        codecs.getincrementaldecoder('utf-8')().decode(data, final=False)
+    except UnicodeDecodeError:
+        return None
+    return 'utf-8'
+
+
+def detect_encoding(file_path, max_bytes=1_000_000):
     """
     Detect the encoding of a file.
     
+    BOM-marked files, and UTF-8 files with non-ASCII text near the start,
+    are recognised from a short sample. Other files are fed to chardet in
+    blocks and detection stops as soon as chardet is confident, so only the
+    start of large files is read.
+    Results are cached until the file's size or modification time changes.
+    
     Args:
         file_path (str): Path to the file
+        max_bytes (int): Maximum number of bytes to feed to the detector
         
     Returns:
         str: Detected encoding
     """
-    with open(file_path, 'rb') as f:
-        raw_data = f.read()
-        result = chardet.detect(raw_data)
-    return result['encoding']
+    stat = os.stat(file_path)
+    return _detect_encoding(file_path, stat.st_mtime_ns, stat.st_size, max_bytes)
+
+
+@functools.lru_cache(maxsize=64)
+def _detect_encoding(file_path, mtime_ns, size, max_bytes):
+    """
+    Cached worker for detect_encoding.
+    
+    Args:
+        file_path (str): Path to the file
+        mtime_ns (int): Modification time of the file, used only as cache key
+        size (int): Size of the file, used only as cache key
+        max_bytes (int): Maximum number of bytes to feed to the detector
+        
+    Returns:
+        str: Detected encoding
+    """
+    encoding = _fast_encoding(file_path)
+    if encoding:
+        return encoding
+    
+    # Map the file rather than reading it so only the pages handed to chardet
+    # are loaded. Empty files never get here: _fast_encoding handles them
+    detector = chardet.UniversalDetector()
+    with open(file_path, 'rb') as f, \
+         mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        limit = min(len(mm), max_bytes)
+        end = 0
+        for offset in range(0, limit, 65536):
+            end = min(offset + 65536, limit)
+            detector.feed(mm[offset:end])
+            if detector.done:
+                break
+        read_whole_file = end == len(mm)
+    detector.close()
+    
+    encoding = detector.result['encoding'] or 'utf-8'
+    # An ASCII verdict only covers the bytes chardet saw. If the scan stopped
+    # early, use UTF-8, its superset, so later non-ASCII text still decodes
+    if encoding.lower() == 'ascii' and not read_whole_file:
+        return 'utf-8'
+    return encoding
+
+
+def _count_delimiters(text):
+    """
+    Count occurrences of each potential delimiter in a text sample.
+    
+    Args:
+        text (str): Text to scan
+        
+    Returns:
+        dict: Number of occurrences of each potential delimiter
+    """
+    return {d: text.count(d) for d in _POTENTIAL_DELIMITERS}
 
 
-def verify_csv(file_path, delimiter=','):
+def verify_csv(file_path, delimiter=',', encoding=None):
     """
     Verify the structure of a CSV file and provide information about it.
     
     Args:
         file_path (str): Path to the CSV file
         delimiter (str): CSV delimiter character
+        encoding (str, optional): Known encoding of the file; detected if not given
         
     Returns:
         dict: Information about the CSV file
@@ -50,11 +163,12 @@ def verify_csv(file_path, delimiter=','):
     # Get file size
     file_size = os.path.getsize(file_path)
     
-    # Detect encoding
-    encoding = detect_encoding(file_path)
+    # Detect encoding unless the caller already knows it
+    if encoding is None:
+        encoding = detect_encoding(file_path)
     
     # Read the CSV
-    with open(file_path, 'r', encoding=encoding) as infile:
+    with open(file_path, 'r', encoding=encoding, buffering=_IO_BUFFER_SIZE) as infile:
         # First try to read the file with the specified delimiter
         sample = infile.read(4096)
         infile.seek(0)
@@ -63,8 +177,7 @@ def verify_csv(file_path, delimiter=','):
         if delimiter not in sample:
             print(f"Warning: Delimiter '{delimiter}' not found in file sample. Trying to auto-detect...")
             # Try to detect the delimiter
-            potential_delimiters = [',', ';', '\t', '|']
-            delimiter_counts = {d: sample.count(d) for d in potential_delimiters}
+            delimiter_counts = _count_delimiters(sample)
             best_delimiter = max(delimiter_counts, key=delimiter_counts.get)
             if delimiter_counts[best_delimiter] > 0:
                 print(f"Auto-detected delimiter: '{best_delimiter}'")
@@ -82,14 +195,9 @@ def verify_csv(file_path, delimiter=','):
             print(f"Warning: Headers appear to be a single column. Splitting with delimiter: '{delimiter}'")
             headers = headers[0].split(delimiter)
         
-        # Read all rows
-        rows = []
-        for row in reader:
-            # If row has only one element but contains delimiter, split it
-            if len(row) == 1 and delimiter in row[0]:
-                rows.append(row[0].split(delimiter))
-            else:
-                rows.append(row)
+        # Read all rows, splitting rows that have only one element but contain the delimiter
+        rows = [row[0].split(delimiter) if len(row) == 1 and delimiter in row[0] else row
+                for row in reader]
         
         row_count = len(rows)
         
@@ -114,7 +222,8 @@ def verify_csv(file_path, delimiter=','):
             column_values = [row[i] for row in rows if i < len(row)]
             
             # Try to determine if column is numeric, date, or string
-            numeric_count = sum(1 for val in column_values if val.strip().replace('.', '', 1).isdigit())
+            numeric_count = sum(1 for val in column_values
+                                if val.strip().lstrip('+-').replace('.', '', 1).isdigit())
             if numeric_count > 0.8 * len(column_values):
                 column_data_types.append("numeric")
             else:
@@ -132,7 +241,8 @@ def verify_csv(file_path, delimiter=','):
         "consistent_columns": consistent_columns,
         "is_single_column_csv": is_single_column_csv,
         "empty_cells": empty_cells,
-        "column_data_types": dict(zip(headers, column_data_types))
+        "column_data_types": dict(zip(headers, column_data_types)),
+        "preview_rows": rows[:5]
     }
     
     return results
@@ -173,40 +283,32 @@ def print_verification_results(results):
         if results['empty_cells'] > 0:
             print(f"  - Contains {results['empty_cells']} empty cells")
     
-    # Add a preview of the file content
+    # Add a preview of the file content, kept by verify_csv while reading
     print("\nContent Preview (first 5 rows):")
-    try:
-        with open(results['file_path'], 'r', encoding=results['encoding']) as f:
-            reader = csv.reader(f, delimiter=results['delimiter'])
-            headers = next(reader)
-            print(f"  Headers: {', '.join(headers)}")
-            
-            # Print first 5 data rows
-            for i, row in enumerate(reader):
-                if i < 5:
-                    # Format row for display
-                    if len(row) > 3:
-                        # For many columns, show first 3 and count
-                        preview = f"{', '.join(row[:3])}... ({len(row)} columns)"
-                    else:
-                        preview = ', '.join(row)
-                    print(f"  Row {i+1}: {preview}")
-                else:
-                    break
-            
-            # Show total row count
-            if results['row_count'] > 5:
-                print(f"  ... and {results['row_count'] - 5} more rows")
-    except Exception as e:
-        print(f"  Error previewing content: {str(e)}")
+    print(f"  Headers: {', '.join(results['headers'])}")
+    
+    # Print first 5 data rows
+    for i, row in enumerate(results['preview_rows']):
+        # Format row for display
+        if len(row) > 3:
+            # For many columns, show first 3 and count
+            preview = f"{', '.join(row[:3])}... ({len(row)} columns)"
+        else:
+            preview = ', '.join(row)
+        print(f"  Row {i+1}: {preview}")
+    
+    # Show total row count
+    if results['row_count'] > 5:
+        print(f"  ... and {results['row_count'] - 5} more rows")
 
 
-def verify_txt(file_path):
+def verify_txt(file_path, encoding=None):
     """
     Verify the structure of a TXT file and provide information about it.
     
     Args:
         file_path (str): Path to the TXT file
+        encoding (str, optional): Known encoding of the file; detected if not given
         
     Returns:
         dict: Information about the TXT file
@@ -227,63 +329,74 @@ def verify_txt(file_path):
     large_file_threshold = 10 * 1024 * 1024  # 10 MB
     is_large_file = file_size > large_file_threshold
     
-    # Detect encoding
-    encoding = detect_encoding(file_path)
+    # Detect encoding unless the caller already knows it
+    if encoding is None:
+        encoding = detect_encoding(file_path)
     
     # Read the TXT
-    with open(file_path, 'r', encoding=encoding) as infile:
+    with open(file_path, 'r', encoding=encoding, buffering=_IO_BUFFER_SIZE) as infile:
         if is_large_file:
             print(f"Large file detected ({file_size / (1024*1024):.2f} MB). Using sampling approach.")
-            # Read first 100 lines and last 100 lines for large files
+            # Keep the first 100 and last 100 lines as a sample, gathering
+            # line statistics for the whole file in the same single pass
             first_lines = []
-            for i, line in enumerate(infile):
-                if i < 100:
+            last_lines = deque(maxlen=100)
+            line_count = 0
+            empty_lines = 0
+            total_length = 0
+            min_length = sys.maxsize
+            max_length = 0
+            for line in infile:
+                if line_count < 100:
                     first_lines.append(line)
                 else:
-                    break
-            
-            # Get approximate line count for large files
-            infile.seek(0)
-            line_count = sum(1 for _ in infile)
-            
-            # Sample lines from the middle
-            middle_lines = []
-            if line_count > 200:
-                infile.seek(0)
-                middle_start = max(100, line_count // 2 - 50)
-                for i, line in enumerate(infile):
-                    if i >= middle_start and i < middle_start + 100:
-                        middle_lines.append(line)
-                    elif i >= middle_start + 100:
-                        break
+                    last_lines.append(line)
+                line_count += 1
+                
+                line_length = len(line)
+                total_length += line_length
+                if line_length < min_length:
+                    min_length = line_length
+                if line_length > max_length:
+                    max_length = line_length
+                if not line.strip():
+                    empty_lines += 1
             
             # Combine samples
-            lines = first_lines + middle_lines
+            lines = first_lines + list(last_lines)
+            
+            avg_line_length = total_length / max(1, line_count)
+            consistent_line_length = max_length - min_length < 10
         else:
             lines = infile.readlines()
             line_count = len(lines)
-        
-        # Check for empty lines
-        empty_lines = sum(1 for line in lines if not line.strip())
+            
+            # Check for empty lines
+            empty_lines = sum(1 for line in lines if not line.strip())
+            
+            # Calculate average line length
+            avg_line_length = sum(len(line) for line in lines) / max(1, len(lines))
+            
+            # Check for consistent line lengths
+            line_lengths = [len(line) for line in lines]
+            consistent_line_length = max(line_lengths) - min(line_lengths) < 10
         
         # Check for potential CSV structure
-        potential_delimiters = [',', ';', '\t', '|']
-        delimiter_counts = {d: sum(line.count(d) for line in lines) for d in potential_delimiters}
-        best_delimiter = max(delimiter_counts, key=delimiter_counts.get)
+        best_delimiter = None
         
         # Enhanced CSV detection
         is_potential_csv = False
         csv_confidence = 0
         
         # Check if first line might be a header
-        if lines and any(d in lines[0] for d in potential_delimiters):
+        if lines:
             # Count delimiters in first line (potential header)
-            header_delimiters = {d: lines[0].count(d) for d in potential_delimiters}
+            header_delimiters = _count_delimiters(lines[0])
             best_header_delimiter = max(header_delimiters, key=header_delimiters.get)
             
             if header_delimiters[best_header_delimiter] > 0:
                 # Check if most lines have similar delimiter counts
-                expected_count = lines[0].count(best_header_delimiter)
+                expected_count = header_delimiters[best_header_delimiter]
                 matching_lines = sum(1 for line in lines[1:] 
                                     if line.strip() and abs(line.count(best_header_delimiter) - expected_count) <= 2)
                 
@@ -291,13 +404,6 @@ def verify_txt(file_path):
                     is_potential_csv = True
                     best_delimiter = best_header_delimiter
                     csv_confidence = matching_lines / max(1, len(lines) - 1)
-        
-        # Calculate average line length
-        avg_line_length = sum(len(line) for line in lines) / max(1, len(lines))
-        
-        # Check for consistent line lengths
-        line_lengths = [len(line) for line in lines]
-        consistent_line_length = max(line_lengths) - min(line_lengths) < 10
     
     # Compile results
     results = {
@@ -311,7 +417,8 @@ def verify_txt(file_path):
         "potential_csv": is_potential_csv,
         "potential_delimiter": best_delimiter if is_potential_csv else None,
         "csv_confidence": csv_confidence if is_potential_csv else 0,
-        "is_large_file": is_large_file
+        "is_large_file": is_large_file,
+        "preview_lines": lines[:3]
     }
     
     return results
@@ -359,30 +466,18 @@ def print_txt_verification_results(results):
             if results['potential_csv']:
                 print("    (This is normal for CSV-like files with varying field lengths)")
     
-    # Add a preview of the file content
+    # Add a preview of the file content, kept by verify_txt while reading
     print("\nContent Preview (first 3 lines):")
-    try:
-        with open(results['file_path'], 'r', encoding=results['encoding']) as f:
-            lines = []
-            for i, line in enumerate(f):
-                if i < 3:
-                    # Truncate long lines for display
-                    preview = line.strip()
-                    if len(preview) > 80:
-                        preview = preview[:77] + "..."
-                    lines.append(preview)
-                else:
-                    break
-            
-            # Print the preview lines
-            for i, line in enumerate(lines):
-                print(f"  Line {i+1}: {line}")
-            
-            # Show total line count
-            if results['line_count'] > 3:
-                print(f"  ... and {results['line_count'] - 3} more lines")
-    except Exception as e:
-        print(f"  Error previewing content: {str(e)}")
+    for i, line in enumerate(results['preview_lines']):
+        # Truncate long lines for display
+        preview = line.strip()
+        if len(preview) > 80:
+            preview = preview[:77] + "..."
+        print(f"  Line {i+1}: {preview}")
+    
+    # Show total line count
+    if results['line_count'] > 3:
+        print(f"  ... and {results['line_count'] - 3} more lines")
 
 
 def transform_file(input_file, output_file, target_encoding='utf-8', delimiter=','):
@@ -394,11 +489,14 @@ def transform_file(input_file, output_file, target_encoding='utf-8', delimiter='
         output_file (str): Path to save the transformed file
         target_encoding (str): Target encoding (default: utf-8)
         delimiter (str): CSV delimiter character (for CSV files)
+        
+    Returns:
+        bool: True if the transformed file was written
     """
     # Check if file exists
     if not os.path.exists(input_file):
         print(f"Error: File not found at '{input_file}'")
-        return
+        return False
     
     # Detect source encoding
     source_encoding = detect_encoding(input_file)
@@ -412,36 +510,41 @@ def transform_file(input_file, output_file, target_encoding='utf-8', delimiter='
     clean_output_path = output_file
     
     if file_ext in ['.csv', '.tsv']:
-        # Handle CSV/TSV files
-        with open(input_file, 'r', encoding=source_encoding) as infile:
+        # Handle CSV/TSV files. Rows are streamed straight to the output, unless
+        # the output is the input file itself, which must be read completely first
+        in_place = os.path.exists(output_file) and os.path.samefile(input_file, output_file)
+        
+        with open(input_file, 'r', encoding=source_encoding, newline='', buffering=_IO_BUFFER_SIZE) as infile:
             # Auto-detect delimiter if not specified
             if delimiter == 'auto':
                 sample = infile.read(4096)
                 infile.seek(0)
-                potential_delimiters = [',', ';', '\t', '|']
-                delimiter_counts = {d: sample.count(d) for d in potential_delimiters}
+                delimiter_counts = _count_delimiters(sample)
                 delimiter = max(delimiter_counts, key=delimiter_counts.get)
                 print(f"Auto-detected delimiter: '{delimiter}'")
             
             reader = csv.reader(infile, delimiter=delimiter)
-            headers = next(reader)
-            rows = list(reader)
-        
-        # Write to output file with target encoding
-        with open(output_file, 'w', encoding=target_encoding, newline='') as outfile:
-            writer = csv.writer(outfile, delimiter=delimiter)
-            writer.writerow(headers)
-            writer.writerows(rows)
+            rows = list(reader) if in_place else reader
+            
+            # Write to output file with target encoding
+            with open(output_file, 'w', encoding=target_encoding, newline='', buffering=_IO_BUFFER_SIZE) as outfile:
+                writer = csv.writer(outfile, delimiter=delimiter)
+                writer.writerows(rows)
     
     elif file_ext in ['.txt'] or file_ext == '':
         # Handle TXT files
-        with open(input_file, 'r', encoding=source_encoding) as infile:
+        with open(input_file, 'r', encoding=source_encoding, buffering=_IO_BUFFER_SIZE) as infile:
             content = infile.read()
         
         # Check if we're converting TXT to CSV
         if output_ext in ['.csv', '.tsv']:
             print("Converting TXT to CSV format...")
             
+            # Split the content already in memory rather than reading the file again
+            lines = content.split('\n')
+            if not lines[-1]:
+                lines.pop()  # A trailing newline does not start another line
+            
             # First verify if the TXT has CSV-like structure
             results = verify_txt(input_file)
             
@@ -450,45 +553,25 @@ def transform_file(input_file, output_file, target_encoding='utf-8', delimiter='
                 csv_delimiter = results['potential_delimiter']
                 print(f"Using detected delimiter: '{csv_delimiter}'")
                 
-                # Read the file again and parse as CSV
-                with open(input_file, 'r', encoding=source_encoding) as infile:
-                    lines = infile.readlines()
-                    
-                    # Parse each line as CSV
-                    csv_rows = []
-                    max_columns = 0
-                    
-                    for line in lines:
-                        if csv_delimiter in line:
-                            row = line.strip().split(csv_delimiter)
-                            csv_rows.append(row)
-                            max_columns = max(max_columns, len(row))
-                        else:
-                            csv_rows.append([line.strip()])
-                            max_columns = max(max_columns, 1)
-                    
-                    # Ensure all rows have the same number of columns
-                    for i in range(len(csv_rows)):
-                        while len(csv_rows[i]) < max_columns:
-                            csv_rows[i].append("")
+                # Parse each line as CSV
+                csv_rows = [line.strip().split(csv_delimiter) for line in lines]
+                max_columns = max(map(len, csv_rows), default=0)
                 
-                # Write as CSV
-                with open(output_file, 'w', encoding=target_encoding, newline='') as outfile:
+                # Ensure all rows have the same number of columns
+                csv_rows = [row + [""] * (max_columns - len(row)) for row in csv_rows]
+                
+                # Write as CSV, the first row being the header
+                with open(output_file, 'w', encoding=target_encoding, newline='', buffering=_IO_BUFFER_SIZE) as outfile:
                     writer = csv.writer(outfile, delimiter=delimiter)
-                    # First row as header
-                    if csv_rows:
-                        writer.writerow(csv_rows[0])
-                        # Rest as data
-                        writer.writerows(csv_rows[1:])
+                    writer.writerows(csv_rows)
                 
                 print(f"Converted TXT to CSV with {len(csv_rows)-1} data rows and {max_columns} columns")
             else:
                 print("Warning: TXT file doesn't appear to have CSV structure. Creating a single-column CSV.")
-                with open(input_file, 'r', encoding=source_encoding) as infile:
-                    lines = [line.strip() for line in infile.readlines()]
+                lines = [line.strip() for line in lines]
                 
                 # Create a proper single-column CSV with consistent structure
-                with open(output_file, 'w', encoding=target_encoding, newline='') as outfile:
+                with open(output_file, 'w', encoding=target_encoding, newline='', buffering=_IO_BUFFER_SIZE) as outfile:
                     writer = csv.writer(outfile, delimiter=delimiter)
                     writer.writerow(["Content"])  # Header
                     
@@ -500,15 +583,16 @@ def transform_file(input_file, output_file, target_encoding='utf-8', delimiter='
                 print(f"Created single-column CSV with {len(lines)} rows")
         else:
             # Just convert encoding
-            with open(output_file, 'w', encoding=target_encoding) as outfile:
+            with open(output_file, 'w', encoding=target_encoding, buffering=_IO_BUFFER_SIZE) as outfile:
                 outfile.write(content)
     
     else:
         print(f"Unsupported file type: {file_ext}")
-        return
+        return False
     
     # At the end of the function, use the clean path for display
     print(f"Transformed file saved to {clean_output_path} with {target_encoding} encoding")
+    return True
 
 
 def find_file(file_path):
@@ -533,10 +617,9 @@ def find_file(file_path):
         return file_path
     
     # Look for files with similar names
-    similar_files = []
-    for file in os.listdir(directory):
-        if filename.lower() in file.lower():
-            similar_files.append(os.path.join(directory, file))
+    needle = filename.lower()
+    with os.scandir(directory) as entries:
+        similar_files = [entry.path for entry in entries if needle in entry.name.lower()]
     
     if similar_files:
         print(f"File not found, but found {len(similar_files)} similar files:")
@@ -613,18 +696,19 @@ def main():
             output_file = os.path.join(input_dir, input_name + output_ext)
             print(f"No output file specified. Using: {output_file}")
         
-        transform_file(file_path, output_file, args.encoding, args.delimiter)
+        transformed = transform_file(file_path, output_file, args.encoding, args.delimiter)
         
-        # Verify the transformed file if requested
-        if args.verify_after and os.path.exists(output_file):
+        # Verify the transformed file if requested. It was just written in the
+        # target encoding, so there is no need to detect it again
+        if args.verify_after and transformed:
             print("\nVerifying transformed file...")
             output_ext = os.path.splitext(output_file)[1].lower()
             if output_ext in ['.csv', '.tsv']:
-                results = verify_csv(output_file, args.delimiter)
+                results = verify_csv(output_file, args.delimiter, encoding=args.encoding)
                 if results:
                     print_verification_results(results)
             elif output_ext in ['.txt'] or output_ext == '':
-                results = verify_txt(output_file)
+                results = verify_txt(output_file, encoding=args.encoding)
                 if results:
                     print_txt_verification_results(results)
         